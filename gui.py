@@ -1,11 +1,18 @@
 import os
 import threading
+import time
 import tkinter as tk
 import logging
 from tkinter import filedialog, messagebox, ttk
 
 from model_manager import WhisperModelManager
-from transcriber import transcribe_audio, diarize_transcription
+from model_store import checkpoint_name
+from transcriber import (
+    DRAFT_MODEL,
+    diarize_transcription,
+    transcribe_audio,
+    transcribe_draft_refine,
+)
 
 
 class TextHandler(logging.Handler):
@@ -30,12 +37,13 @@ class WhisperGUI:
     def __init__(self, master: tk.Tk) -> None:
         self.master = master
         master.title("🎙️ Transcriptor Whisper Avanzado")
-        master.geometry("700x500")
+        master.geometry("700x650")
 
         self.file_path = tk.StringVar()
         self.modelo = tk.StringVar(value="base")
         self.idioma = tk.StringVar(value="es")
         self.diarize = tk.BooleanVar(value=False)
+        self.borrador = tk.BooleanVar(value=False)
 
         self._build_widgets()
         handler = TextHandler(self._append_message)
@@ -59,7 +67,8 @@ class WhisperGUI:
         self._model_map = {}
         modelos = []
         for nombre in disponibles:
-            display = f"{nombre} (local)" if nombre in locales else nombre
+            es_local = nombre in locales or checkpoint_name(nombre) in locales
+            display = f"{nombre} (local)" if es_local else nombre
             modelos.append(display)
             self._model_map[display] = nombre
 
@@ -72,14 +81,25 @@ class WhisperGUI:
         self.combo_idioma = ttk.Combobox(config_frame, textvariable=self.idioma, values=self.IDIOMAS, width=5)
         self.combo_idioma.pack(side=tk.LEFT, padx=5)
         ttk.Checkbutton(config_frame, text="Diarización", variable=self.diarize).pack(side=tk.LEFT, padx=5)
+        ttk.Checkbutton(config_frame, text="Borrador rápido", variable=self.borrador).pack(side=tk.LEFT, padx=5)
         ttk.Button(config_frame, text="Borrar Modelo Local", command=self._borrar_modelo_local).pack(side=tk.LEFT, padx=5)
 
+        self.info_modelo = tk.StringVar()
+        ttk.Label(cont, textvariable=self.info_modelo).pack(fill=tk.X)
+        self.combo_modelo.bind("<<ComboboxSelected>>", lambda _e: self._mostrar_info_modelo())
+        self._mostrar_info_modelo()
+
 
         ttk.Button(cont, text="Transcribir", command=self.iniciar_transcripcion).pack(pady=10)
 
         self.progress = ttk.Progressbar(cont, mode="indeterminate")
         self.progress.pack(fill=tk.X, pady=5)
 
+        ttk.Label(cont, text="Transcripción:").pack(anchor=tk.W)
+        self.texto_transcripcion = tk.Text(cont, height=8, state=tk.DISABLED, wrap=tk.WORD)
+        self.texto_transcripcion.tag_configure("borrador", foreground="gray")
+        self.texto_transcripcion.pack(fill=tk.BOTH, expand=True)
+
         self.texto_mensajes = tk.Text(cont, height=10, state=tk.DISABLED)
         self.texto_mensajes.pack(fill=tk.BOTH, expand=True)
 
@@ -102,20 +122,46 @@ class WhisperGUI:
             else:
                 messagebox.showerror("Error", f"No se pudo eliminar el modelo '{modelo_real}'. Puede que no exista localmente o haya un error.")
 
-    def _actualizar_lista_modelos(self) -> None:
-        """Actualiza las opciones del combobox de modelos después de un borrado."""
-        disponibles = WhisperModelManager.get_available_models()
+    def _actualizar_lista_modelos(self, disponibles=None) -> None:
+        """Actualiza las opciones del combobox de modelos después de un borrado.
+
+        Si se pasa ``disponibles`` no se consulta la lista remota y solo se
+        actualizan las marcas "(local)" a partir del almacén.
+        """
+        if disponibles is None:
+            disponibles = WhisperModelManager.get_available_models()
         locales = WhisperModelManager._modelos_locales()
+        actual = self._model_map.get(self.modelo.get(), self.modelo.get())
         self._model_map = {}
         modelos_display = []
         for nombre in disponibles:
-            display = f"{nombre} (local)" if nombre in locales else nombre
+            es_local = nombre in locales or checkpoint_name(nombre) in locales
+            display = f"{nombre} (local)" if es_local else nombre
             modelos_display.append(display)
             self._model_map[display] = nombre
         self.combo_modelo['values'] = modelos_display
-        # Si el modelo borrado era el seleccionado, restablecer la selección
+        # Mantener el modelo seleccionado aunque cambie su marca "(local)"
         if self.modelo.get() not in modelos_display:
-            self.modelo.set("base") # O cualquier modelo por defecto
+            display_actual = next((d for d, n in self._model_map.items() if n == actual), None)
+            self.modelo.set(display_actual or "base") # O cualquier modelo por defecto
+        self._mostrar_info_modelo()
+
+    def _mostrar_info_modelo(self) -> None:
+        """Muestra el tamaño y la fecha de último uso del modelo seleccionado."""
+        seleccionado = self.modelo.get()
+        modelo_real = self._model_map.get(seleccionado, seleccionado)
+        info = WhisperModelManager.get_store().get(modelo_real)
+        if not info:
+            self.info_modelo.set(f"Modelo '{modelo_real}' no descargado")
+            return
+        tamano = info["size"] / (1024 * 1024)
+        if info["last_used"] is None:
+            ultimo_uso = "nunca usado"
+        else:
+            ultimo_uso = "último uso " + time.strftime(
+                "%Y-%m-%d %H:%M", time.localtime(info["last_used"])
+            )
+        self.info_modelo.set(f"Modelo '{modelo_real}': {tamano:.0f} MB, {ultimo_uso}")
 
     def seleccionar_archivo(self) -> None:
         tipos = [
@@ -140,6 +186,15 @@ class WhisperGUI:
         self.texto_mensajes.see(tk.END)
         self.texto_mensajes.configure(state=tk.DISABLED)
 
+    def _mostrar_segmentos(self, segmentos) -> None:
+        """Muestra la transcripción parcial; el texto del borrador va en gris."""
+        self.texto_transcripcion.configure(state=tk.NORMAL)
+        self.texto_transcripcion.delete("1.0", tk.END)
+        for seg in segmentos:
+            tags = () if seg["refined"] else ("borrador",)
+            self.texto_transcripcion.insert(tk.END, seg["text"] + "\n", tags)
+        self.texto_transcripcion.configure(state=tk.DISABLED)
+
     def _transcribir(self) -> None:
         ruta = self.file_path.get()
         seleccionado = self.modelo.get()
@@ -147,14 +202,28 @@ class WhisperGUI:
         idioma = self.idioma.get() or None
         try:
             self._append_message("Iniciando transcripción...")
-            nombre_salida = transcribe_audio(
-                ruta, modelo, idioma or "", status_cb=self._append_message
-            )
+            self.master.after(0, self._mostrar_segmentos, [])
+            # El borrador solo compensa si el modelo elegido es más lento que el del borrador
+            if self.borrador.get() and modelo not in ("tiny", DRAFT_MODEL):
+                nombre_salida, _stats = transcribe_draft_refine(
+                    ruta, modelo, idioma or "", status_cb=self._append_message,
+                    segments_cb=lambda segs: self.master.after(0, self._mostrar_segmentos, segs),
+                )
+            else:
+                nombre_salida = transcribe_audio(
+                    ruta, modelo, idioma or "", status_cb=self._append_message
+                )
             if self.diarize.get():
                 nombre_salida = diarize_transcription(
                     ruta, nombre_salida, status_cb=self._append_message
                 )
             self._append_message(f"Transcripción completada: {nombre_salida}")
+            with open(nombre_salida, "r", encoding="utf-8") as fh:
+                resultado = [{"text": linea.rstrip("\n"), "refined": True} for linea in fh]
+            self.master.after(0, self._mostrar_segmentos, resultado)
+            # Sin consultar la red: solo cambian los modelos locales
+            conocidos = list(dict.fromkeys(self._model_map.values()))
+            self.master.after(0, self._actualizar_lista_modelos, conocidos)
         except Exception as e:
             self._append_message(f"Error: {e}")
         finally:
@@ -1,5 +1,6 @@
-import os
-from typing import Dict
+from typing import Dict, Optional
+
+from model_store import LocalModelStore
 
 try:
     import requests
@@ -43,24 +44,29 @@ class WhisperModelManager:
             # Ante cualquier problema de red se devuelven los modelos por defecto
             return WhisperModelManager.FALLBACK_MODELS
 
-    @staticmethod
-    def _modelos_locales() -> Dict[str, str]:
-        """Busca modelos disponibles localmente."""
-        modelos = {}
+    _store: Optional[LocalModelStore] = None
 
-        dirs = [
-            os.path.join(os.path.dirname(os.path.abspath(__file__)), "models"),
-            os.path.join(os.path.expanduser("~"), ".cache", "whisper"),
-        ]
+    @classmethod
+    def get_store(cls) -> LocalModelStore:
+        """Devuelve el almacén de modelos locales, creándolo la primera vez.
 
-        for directorio in dirs:
-            if os.path.isdir(directorio):
-                for archivo in os.listdir(directorio):
-                    if archivo.endswith(".pt"):
-                        nombre = os.path.splitext(archivo)[0]
-                        modelos[nombre] = f"Modelo local disponible ({archivo})"
+        Las carpetas solo se recorren al crear el almacén; después las
+        consultas se resuelven con el manifiesto. Los SHA256 pendientes se
+        calculan en un hilo aparte para no bloquear la interfaz.
+        """
+        if cls._store is None:
+            cls._store = LocalModelStore()
+            cls._store.refresh()
+            cls._store.hash_pending_async()
+        return cls._store
 
-        return modelos
+    @classmethod
+    def _modelos_locales(cls) -> Dict[str, str]:
+        """Busca modelos disponibles localmente."""
+        return {
+            nombre: f"Modelo local disponible ({nombre}.pt)"
+            for nombre in cls.get_store().models()
+        }
 
     @classmethod
     def get_available_models(cls) -> Dict[str, str]:
@@ -76,28 +82,11 @@ class WhisperModelManager:
             remotos = cls.FALLBACK_MODELS
         modelos = {**remotos, **locales}
         return modelos or cls.FALLBACK_MODELS
-    
+
     @classmethod
     def delete_local_model(cls, model_name: str) -> bool:
         """
         Intenta eliminar un modelo localmente.
         Retorna True si se eliminó, False si no se encontró o hubo error.
         """
-        deleted = False
-        # Rutas donde buscar el modelo
-        dirs = [
-            os.path.join(os.path.dirname(os.path.abspath(__file__)), "models"),
-            os.path.join(os.path.expanduser("~"), ".cache", "whisper"),
-        ]
-
-        for directorio in dirs:
-            model_file_path = os.path.join(directorio, f"{model_name}.pt")
-            if os.path.exists(model_file_path):
-                try:
-                    os.remove(model_file_path)
-                    print(f"Modelo '{model_name}' eliminado de {directorio}")
-                    deleted = True
-                    # No retornar aquí, para buscar y borrar en ambas ubicaciones si existe duplicado
-                except Exception as e:
-                    print(f"Error al eliminar el modelo '{model_name}' de {directorio}: {e}")
-        return deleted
\ No newline at end of file
+        return cls.get_store().delete(model_name)
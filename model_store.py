@@ -0,0 +1,386 @@
+import errno
+import functools
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+
+logger = logging.getLogger(__name__)
+
+BUDGET_ENV_VAR = "WHISPERPY_MODELS_BUDGET_MB"
+
+# Nombres de la CLI cuyo checkpoint se guarda con otro nombre de archivo.
+# Solo se usa si no se puede importar ``whisper`` para consultar ``_MODELS``.
+CHECKPOINT_ALIASES: Dict[str, str] = {
+    "large": "large-v3",
+    "turbo": "large-v3-turbo",
+}
+
+
+def default_model_dirs() -> List[Path]:
+    """Carpetas donde se buscan los modelos, por orden de preferencia."""
+    return [
+        Path(__file__).resolve().parent / "models",
+        Path(os.path.expanduser("~")) / ".cache" / "whisper",
+    ]
+
+
+@functools.lru_cache(maxsize=None)
+def checkpoint_name(model: str) -> str:
+    """Nombre del archivo ``.pt`` (sin extensión) en el que Whisper guarda un modelo.
+
+    Por ejemplo ``large`` se descarga como ``large-v3.pt``.
+    """
+    try:
+        import whisper
+
+        url = whisper._MODELS.get(model)
+        if url:
+            return os.path.splitext(os.path.basename(url))[0]
+    except Exception:  # whisper no instalado o con otra estructura
+        pass
+    return CHECKPOINT_ALIASES.get(model, model)
+
+
+def _sha256(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _budget_from_env() -> Optional[int]:
+    valor = os.environ.get(BUDGET_ENV_VAR)
+    if not valor:
+        return None
+    try:
+        return int(float(valor) * 1024 * 1024)
+    except ValueError:
+        logger.warning("Valor no válido para %s: %s", BUDGET_ENV_VAR, valor)
+        return None
+
+
+class LocalModelStore:
+    """Almacén de modelos locales respaldado por un manifiesto JSON.
+
+    Los modelos se identifican por el nombre de su checkpoint (véase
+    :func:`checkpoint_name`); los métodos públicos aceptan también el
+    nombre usado en la CLI de Whisper.
+
+    El manifiesto guarda, para cada modelo, el backend, el tamaño, el
+    SHA256, la fecha de último uso y las rutas donde está el archivo, de
+    modo que las consultas no necesitan recorrer las carpetas cada vez.
+    Los archivos idénticos en varias carpetas se unifican con enlaces
+    duros (o moviéndolos si están en distintos sistemas de archivos) y, si
+    se define un presupuesto de disco, se eliminan los modelos usados hace
+    más tiempo.
+
+    El SHA256 se calcula por ruta y se guarda junto a su tamaño y fecha de
+    modificación, de modo que solo se recalcula si el archivo cambia.
+    :meth:`refresh` no calcula ningún hash; de eso se encarga
+    :meth:`hash_pending`, pensado para ejecutarse en segundo plano.
+    """
+
+    BACKEND = "openai-whisper"
+
+    def __init__(
+        self,
+        dirs: Optional[Iterable[Union[str, Path]]] = None,
+        manifest_path: Optional[Union[str, Path]] = None,
+        budget_bytes: Optional[int] = None,
+    ) -> None:
+        self.dirs = [Path(d) for d in (dirs or default_model_dirs())]
+        self.manifest_path = (
+            Path(manifest_path) if manifest_path else self.dirs[0] / "manifest.json"
+        )
+        self.budget_bytes = budget_bytes if budget_bytes is not None else _budget_from_env()
+        self._lock = threading.RLock()
+        # Rutas cuyo hash se está calculando, para no repetirlo en paralelo
+        self._hashing: set = set()
+        self._entries: Dict[str, dict] = self._load()
+
+    # ------------------------------------------------------------------
+    # Persistencia del manifiesto
+    # ------------------------------------------------------------------
+    def _load(self) -> Dict[str, dict]:
+        if not self.manifest_path.is_file():
+            return {}
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as fh:
+                data = json.load(fh)
+            return dict(data.get("models", {}))
+        except (OSError, ValueError) as e:
+            logger.warning("No se pudo leer el manifiesto %s: %s", self.manifest_path, e)
+            return {}
+
+    def _save(self) -> None:
+        try:
+            self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.manifest_path.with_suffix(".tmp")
+            with open(tmp, "w", encoding="utf-8") as fh:
+                json.dump({"version": 1, "models": self._entries}, fh, indent=2)
+            os.replace(tmp, self.manifest_path)
+        except OSError as e:
+            logger.warning("No se pudo guardar el manifiesto %s: %s", self.manifest_path, e)
+
+    # ------------------------------------------------------------------
+    # Consulta
+    # ------------------------------------------------------------------
+    def models(self) -> Dict[str, dict]:
+        """Devuelve una copia de las entradas del manifiesto."""
+        with self._lock:
+            return {nombre: dict(info) for nombre, info in self._entries.items()}
+
+    def get(self, name: str) -> Optional[dict]:
+        name = checkpoint_name(name)
+        with self._lock:
+            info = self._entries.get(name)
+            return dict(info) if info else None
+
+    def path_for(self, name: str) -> Optional[Path]:
+        """Ruta preferida del modelo, o ``None`` si no está en el almacén."""
+        info = self.get(name)
+        if not info:
+            return None
+        for ruta in info["paths"]:
+            if Path(ruta).is_file():
+                return Path(ruta)
+        return None
+
+    def total_size(self) -> int:
+        """Espacio ocupado en disco, contando una sola vez los enlaces duros."""
+        with self._lock:
+            inodos = set()
+            total = 0
+            for info in self._entries.values():
+                for ruta in info["paths"]:
+                    try:
+                        st = os.stat(ruta)
+                    except OSError:
+                        continue
+                    clave = (st.st_dev, st.st_ino)
+                    if clave not in inodos:
+                        inodos.add(clave)
+                        total += st.st_size
+            return total
+
+    # ------------------------------------------------------------------
+    # Actualización
+    # ------------------------------------------------------------------
+    def _candidate_paths(self, name: str) -> List[Path]:
+        return [d / f"{name}.pt" for d in self.dirs if (d / f"{name}.pt").is_file()]
+
+    def _build_entry(self, name: str, paths: List[Path]) -> dict:
+        """Crea la entrada de un modelo reutilizando los hashes guardados."""
+        previa = self._entries.get(name, {})
+        archivos_previos = previa.get("files", {})
+        archivos = {}
+        for ruta in paths:
+            st = ruta.stat()
+            cache = archivos_previos.get(str(ruta), {})
+            vigente = cache.get("size") == st.st_size and cache.get("mtime") == st.st_mtime
+            archivos[str(ruta)] = {
+                "size": st.st_size,
+                "mtime": st.st_mtime,
+                "sha256": cache.get("sha256") if vigente else None,
+            }
+        principal = archivos[str(paths[0])]
+        return {
+            "name": name,
+            "backend": self.BACKEND,
+            "size": principal["size"],
+            "mtime": principal["mtime"],
+            "sha256": principal["sha256"],
+            "last_used": previa.get("last_used"),
+            "paths": [str(p) for p in paths],
+            "files": archivos,
+        }
+
+    def register(self, name: str) -> Optional[dict]:
+        """Añade o actualiza un modelo revisando solo sus rutas posibles.
+
+        No calcula hashes: quedan pendientes para :meth:`hash_pending`.
+        """
+        name = checkpoint_name(name)
+        with self._lock:
+            paths = self._candidate_paths(name)
+            if not paths:
+                if self._entries.pop(name, None) is not None:
+                    self._save()
+                return None
+            self._entries[name] = self._build_entry(name, paths)
+            self._save()
+            return dict(self._entries[name])
+
+    def refresh(self) -> None:
+        """Vuelve a recorrer las carpetas y sincroniza el manifiesto.
+
+        Solo consulta el tamaño y la fecha de los archivos; los hashes
+        nuevos quedan pendientes para :meth:`hash_pending`.
+        """
+        with self._lock:
+            nombres = set()
+            for directorio in self.dirs:
+                if directorio.is_dir():
+                    for archivo in directorio.iterdir():
+                        if archivo.suffix == ".pt" and archivo.is_file():
+                            nombres.add(archivo.stem)
+            for nombre in list(self._entries):
+                if nombre not in nombres:
+                    del self._entries[nombre]
+            for nombre in sorted(nombres):
+                self._entries[nombre] = self._build_entry(nombre, self._candidate_paths(nombre))
+            self._save()
+
+    def hash_pending(self, names: Optional[Iterable[str]] = None) -> None:
+        """Calcula los SHA256 que faltan y unifica las copias duplicadas.
+
+        El cálculo se hace sin bloquear el almacén, así que las consultas
+        siguen respondiendo mientras tanto.
+        """
+        with self._lock:
+            nombres = list(names) if names is not None else list(self._entries)
+            pendientes: List[Tuple[str, str, float]] = [
+                (nombre, ruta, info["mtime"])
+                for nombre in nombres
+                for ruta, info in self._entries.get(nombre, {}).get("files", {}).items()
+                if info["sha256"] is None and ruta not in self._hashing
+            ]
+            self._hashing.update(ruta for _nombre, ruta, _mtime in pendientes)
+
+        calculados = []
+        try:
+            for nombre, ruta, mtime in pendientes:
+                try:
+                    logger.info("Calculando SHA256 de %s", ruta)
+                    calculados.append((nombre, ruta, mtime, _sha256(Path(ruta))))
+                except OSError as e:
+                    logger.warning("No se pudo calcular el SHA256 de %s: %s", ruta, e)
+        finally:
+            with self._lock:
+                self._hashing.difference_update(ruta for _nombre, ruta, _mtime in pendientes)
+
+        with self._lock:
+            for nombre, ruta, mtime, sha in calculados:
+                info = self._entries.get(nombre, {}).get("files", {}).get(ruta)
+                # Ignorar el hash si el archivo cambió mientras se calculaba
+                if info is not None and info["mtime"] == mtime:
+                    info["sha256"] = sha
+            for nombre in nombres:
+                entrada = self._entries.get(nombre)
+                if entrada:
+                    entrada["sha256"] = entrada["files"][entrada["paths"][0]]["sha256"]
+                    self._dedupe(nombre)
+            self._save()
+
+    def hash_pending_async(self, names: Optional[Iterable[str]] = None) -> None:
+        """Ejecuta :meth:`hash_pending` en un hilo en segundo plano."""
+        if names is not None:
+            names = [checkpoint_name(n) for n in names]
+        threading.Thread(target=self.hash_pending, args=(names,), daemon=True).start()
+
+    def touch(self, name: str) -> None:
+        """Marca un modelo como usado ahora."""
+        name = checkpoint_name(name)
+        with self._lock:
+            if name in self._entries:
+                self._entries[name]["last_used"] = time.time()
+                self._save()
+
+    # ------------------------------------------------------------------
+    # De-duplicación y borrado
+    # ------------------------------------------------------------------
+    def _dedupe(self, name: str) -> None:
+        """Unifica las copias idénticas de un modelo en distintas carpetas.
+
+        Solo compara rutas cuyo hash ya está calculado.
+        """
+        info = self._entries[name]
+        paths = [Path(p) for p in info["paths"]]
+        if len(paths) < 2 or info["sha256"] is None:
+            return
+        principal = paths[0]
+        conservadas = [str(principal)]
+        for copia in paths[1:]:
+            try:
+                if os.path.samefile(principal, copia):
+                    conservadas.append(str(copia))
+                    continue
+                if info["files"][str(copia)]["sha256"] != info["sha256"]:
+                    conservadas.append(str(copia))
+                    continue
+                tmp = copia.with_suffix(".pt.tmp")
+                try:
+                    os.link(principal, tmp)
+                    os.replace(tmp, copia)
+                    # La copia es ahora el mismo archivo: su hash sigue siendo válido
+                    st = copia.stat()
+                    info["files"][str(copia)] = {
+                        "size": st.st_size,
+                        "mtime": st.st_mtime,
+                        "sha256": info["sha256"],
+                    }
+                    conservadas.append(str(copia))
+                    logger.info("Modelo duplicado %s enlazado a %s", copia, principal)
+                except OSError as e:
+                    if tmp.exists():
+                        tmp.unlink()
+                    if e.errno != errno.EXDEV:
+                        raise
+                    # Carpetas en distintos sistemas de archivos: se conserva una sola copia
+                    copia.unlink()
+                    info["files"].pop(str(copia), None)
+                    logger.info("Modelo duplicado %s eliminado; se usa %s", copia, principal)
+            except OSError as e:
+                logger.warning("No se pudo unificar %s: %s", copia, e)
+                conservadas.append(str(copia))
+        info["paths"] = conservadas
+
+    def delete(self, name: str) -> bool:
+        """Elimina todas las copias de un modelo. Retorna True si borró alguna."""
+        name = checkpoint_name(name)
+        with self._lock:
+            deleted = False
+            for ruta in self._candidate_paths(name):
+                try:
+                    ruta.unlink()
+                    logger.info("Modelo '%s' eliminado de %s", name, ruta.parent)
+                    deleted = True
+                except OSError as e:
+                    logger.error("Error al eliminar el modelo '%s' de %s: %s", name, ruta.parent, e)
+            if self._candidate_paths(name):
+                self._entries[name] = self._build_entry(name, self._candidate_paths(name))
+            else:
+                self._entries.pop(name, None)
+            self._save()
+            return deleted
+
+    def enforce_budget(self, keep: Iterable[str] = ()) -> List[str]:
+        """Elimina los modelos menos usados hasta respetar el presupuesto.
+
+        Los modelos de ``keep`` nunca se eliminan. Devuelve los nombres
+        de los modelos eliminados.
+        """
+        if self.budget_bytes is None:
+            return []
+        protegidos = {checkpoint_name(n) for n in keep}
+        eliminados: List[str] = []
+        with self._lock:
+            candidatos = sorted(
+                (n for n in self._entries if n not in protegidos),
+                # Los modelos nunca usados se ordenan por su fecha de descarga
+                key=lambda n: self._entries[n]["last_used"] or self._entries[n]["mtime"],
+            )
+            for nombre in candidatos:
+                if self.total_size() <= self.budget_bytes:
+                    break
+                if self.delete(nombre):
+                    eliminados.append(nombre)
+                    logger.info("Modelo '%s' eliminado por límite de espacio", nombre)
+        return eliminados
@@ -0,0 +1,19 @@
+import sys
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from model_manager import WhisperModelManager
+from model_store import BUDGET_ENV_VAR, LocalModelStore
+
+
+@pytest.fixture(autouse=True)
+def isolated_model_store(tmp_path, monkeypatch):
+    """Keep tests away from the real model folders and manifest."""
+    monkeypatch.delenv(BUDGET_ENV_VAR, raising=False)
+    dirs = [tmp_path / "store_models", tmp_path / "store_cache"]
+    store = LocalModelStore(dirs, tmp_path / "store_manifest.json", budget_bytes=None)
+    with mock.patch.object(WhisperModelManager, "_store", store):
+        yield store
@@ -0,0 +1,178 @@
+import io
+import json
+import sys
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from transcriber import transcribe_draft_refine
+
+
+DRAFT = [
+    {"start": 0.0, "end": 2.0, "text": " hola", "avg_logprob": -0.2, "no_speech_prob": 0.1},
+    {"start": 2.0, "end": 4.0, "text": " mundo ruidoso", "avg_logprob": -1.5, "no_speech_prob": 0.1},
+]
+CONFIDENT = [{**DRAFT[0]}, {**DRAFT[1], "text": " mundo", "avg_logprob": -0.3}]
+REFINED = [
+    {"start": 2.0, "end": 4.0, "text": " mundo refinado", "avg_logprob": -0.3, "no_speech_prob": 0.1},
+]
+REFINED_ALL = [
+    {"start": 0.0, "end": 2.0, "text": " hola refinado", "avg_logprob": -0.1, "no_speech_prob": 0.1},
+    *REFINED,
+]
+
+
+class FakePopen:
+    """Simulate the Whisper CLI writing JSON output and verbose segment lines."""
+
+    segments = {}
+    failing = set()
+    calls = []
+    on_wait = None
+
+    def __init__(self, cmd, **kwargs):
+        FakePopen.calls.append((cmd, kwargs))
+        self.model = cmd[cmd.index('--model') + 1]
+        if self.model in FakePopen.failing:
+            self.stdout = io.StringIO("CUDA out of memory\n")
+            self.returncode = 1
+            return
+        segments = FakePopen.segments[self.model]
+        output_dir = Path(cmd[cmd.index('--output_dir') + 1])
+        audio_path = Path(cmd[cmd.index('whisper') + 1])
+        (output_dir / f"{audio_path.stem}.json").write_text(json.dumps({"segments": segments}))
+        self.stdout = io.StringIO(
+            "".join(f"[00:0{s['start']:.0f}.000 --> 00:0{s['end']:.0f}.000]{s['text']}\n" for s in segments)
+        )
+        self.returncode = 0
+
+    def wait(self):
+        if FakePopen.on_wait:
+            FakePopen.on_wait(self)
+        return self.returncode
+
+
+@pytest.fixture
+def fake_whisper(tmp_path):
+    FakePopen.segments = {"base": DRAFT, "large": REFINED}
+    FakePopen.failing = set()
+    FakePopen.calls = []
+    FakePopen.on_wait = None
+    audio_file = tmp_path / "audio.wav"
+    audio_file.write_text("fake")
+    with mock.patch('subprocess.Popen', FakePopen):
+        yield audio_file
+
+
+def run(audio_file, updates, **kwargs):
+    return transcribe_draft_refine(
+        str(audio_file), model='large', language='es',
+        segments_cb=lambda segs: updates.append([s["text"] for s in segs]),
+        **kwargs,
+    )
+
+
+def test_draft_is_shown_first_and_low_confidence_segments_refined(fake_whisper):
+    updates = []
+    result, stats = run(fake_whisper, updates)
+
+    assert updates[0] == ["hola", "mundo ruidoso"]
+    assert updates[-1] == ["hola", "mundo refinado"]
+    refine_cmd = FakePopen.calls[1][0]
+    assert refine_cmd[refine_cmd.index('--clip_timestamps') + 1] == "2.000,4.000"
+    assert Path(result).read_text(encoding="utf-8") == "hola\nmundo refinado\n"
+    assert stats["refined_segments"] == 1
+    assert stats["total_segments"] == 2
+    assert stats["refine_error"] is None
+    assert stats["time_to_first_text"] <= stats["total_time"]
+
+
+def test_refined_segments_arrive_before_whisper_exits(fake_whisper):
+    updates = []
+    seen_at_exit = {}
+    FakePopen.on_wait = lambda proc: seen_at_exit.setdefault(proc.model, list(updates))
+
+    run(fake_whisper, updates)
+
+    assert ["hola", "mundo refinado"] in seen_at_exit["large"]
+    for _cmd, kwargs in FakePopen.calls:
+        assert kwargs["env"]["PYTHONUNBUFFERED"] == "1"
+
+
+def test_refine_all_transcribes_whole_audio(fake_whisper):
+    FakePopen.segments["large"] = REFINED_ALL
+    updates = []
+    result, stats = run(fake_whisper, updates, refine_all=True)
+
+    assert '--clip_timestamps' not in FakePopen.calls[1][0]
+    assert updates[-1] == ["hola refinado", "mundo refinado"]
+    assert stats["refined_segments"] == 2
+    assert stats["single_pass_estimate"] == stats["refine_time"]
+
+
+def test_confident_draft_skips_refinement(fake_whisper):
+    FakePopen.segments["base"] = CONFIDENT
+    updates = []
+    result, stats = run(fake_whisper, updates)
+
+    assert len(FakePopen.calls) == 1
+    assert Path(result).read_text(encoding="utf-8") == "hola\nmundo\n"
+    assert stats["refined_segments"] == 0
+    assert stats["single_pass_estimate"] is None
+
+
+def test_failed_refinement_keeps_draft(fake_whisper):
+    FakePopen.failing = {"large"}
+    updates = []
+    result, stats = run(fake_whisper, updates)
+
+    assert Path(result).read_text(encoding="utf-8") == "hola\nmundo ruidoso\n"
+    assert updates[-1] == ["hola", "mundo ruidoso"]
+    assert "CUDA out of memory" in stats["refine_error"]
+    assert stats["single_pass_estimate"] is None
+
+
+def test_failed_draft_raises(fake_whisper):
+    FakePopen.failing = {"base"}
+    with pytest.raises(RuntimeError, match="CUDA out of memory"):
+        run(fake_whisper, [])
+
+
+def test_draft_budget_does_not_evict_refine_model(fake_whisper, isolated_model_store):
+    models_dir = isolated_model_store.dirs[0]
+    models_dir.mkdir()
+    (models_dir / "large-v3.pt").write_bytes(b"l" * 30)
+    (models_dir / "base.pt").write_bytes(b"b" * 10)
+    isolated_model_store.refresh()
+    isolated_model_store.budget_bytes = 20
+    present_at_refine = []
+    FakePopen.on_wait = lambda proc: present_at_refine.append((models_dir / "large-v3.pt").exists())
+
+    run(fake_whisper, [])
+
+    assert present_at_refine == [True, True]
+
+
+def test_refined_segments_outside_clips_are_ignored(fake_whisper):
+    tail = {"start": 4.0, "end": 6.0, "text": " adiós", "avg_logprob": -0.2, "no_speech_prob": 0.1}
+    overrun = {"start": 4.0, "end": 6.0, "text": " adiós repetido", "avg_logprob": -0.2, "no_speech_prob": 0.1}
+    FakePopen.segments["base"] = [*DRAFT, tail]
+    FakePopen.segments["large"] = [*REFINED, overrun]
+    updates = []
+    result, _stats = run(fake_whisper, updates)
+
+    assert updates[-1] == ["hola", "mundo refinado", "adiós"]
+    assert Path(result).read_text(encoding="utf-8") == "hola\nmundo refinado\nadiós\n"
+
+
+def test_draft_is_shown_before_registering_models(fake_whisper):
+    events = []
+    with mock.patch("transcriber._register_model_use", lambda model, *a, **k: events.append(model)):
+        transcribe_draft_refine(
+            str(fake_whisper), model='large', language='es',
+            segments_cb=lambda segs: events.append("segments"),
+        )
+
+    assert events[:2] == ["segments", "base"]
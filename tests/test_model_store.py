@@ -0,0 +1,122 @@
+import errno
+import os
+import sys
+from pathlib import Path
+from unittest import mock
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from model_store import LocalModelStore
+
+
+def make_store(tmp_path, budget=None):
+    dirs = [tmp_path / "models", tmp_path / "cache"]
+    for d in dirs:
+        d.mkdir(exist_ok=True)
+    return LocalModelStore(dirs, tmp_path / "manifest.json", budget_bytes=budget), dirs
+
+
+def test_manifest_records_models_and_persists(tmp_path):
+    store, (models, _) = make_store(tmp_path)
+    (models / "base.pt").write_bytes(b"x" * 10)
+    store.refresh()
+
+    info = store.get("base")
+    assert info["size"] == 10
+    assert info["backend"] == LocalModelStore.BACKEND
+    assert info["sha256"] is None
+    assert info["last_used"] is None
+
+    store.hash_pending()
+    sha = store.get("base")["sha256"]
+    assert len(sha) == 64
+
+    reloaded, _ = make_store(tmp_path)
+    with mock.patch("model_store._sha256") as sha256:
+        reloaded.refresh()
+        reloaded.hash_pending()
+    sha256.assert_not_called()
+    assert reloaded.get("base")["sha256"] == sha
+
+
+def test_identical_copies_are_deduplicated(tmp_path):
+    store, (models, cache) = make_store(tmp_path)
+    (models / "tiny.pt").write_bytes(b"same")
+    (cache / "tiny.pt").write_bytes(b"same")
+    store.refresh()
+    store.hash_pending()
+
+    assert store.total_size() == 4
+    copia = cache / "tiny.pt"
+    assert not copia.exists() or os.path.samefile(models / "tiny.pt", copia)
+
+
+def test_cross_device_duplicate_is_removed(tmp_path):
+    store, (models, cache) = make_store(tmp_path)
+    (models / "tiny.pt").write_bytes(b"same")
+    (cache / "tiny.pt").write_bytes(b"same")
+    store.refresh()
+
+    with mock.patch("os.link", side_effect=OSError(errno.EXDEV, "cross-device")):
+        store.hash_pending()
+
+    assert not (cache / "tiny.pt").exists()
+    assert store.get("tiny")["paths"] == [str(models / "tiny.pt")]
+
+
+def test_other_link_errors_keep_both_copies(tmp_path):
+    store, (models, cache) = make_store(tmp_path)
+    (models / "tiny.pt").write_bytes(b"same")
+    (cache / "tiny.pt").write_bytes(b"same")
+    store.refresh()
+
+    with mock.patch("os.link", side_effect=OSError(errno.EPERM, "denied")):
+        store.hash_pending()
+
+    assert (cache / "tiny.pt").exists()
+    assert len(store.get("tiny")["paths"]) == 2
+
+
+def test_budget_evicts_least_recently_used(tmp_path):
+    store, (models, _) = make_store(tmp_path, budget=45)
+    for nombre in ("tiny", "base", "small"):
+        (models / f"{nombre}.pt").write_bytes(nombre.encode() * 5)
+    store.refresh()
+    store.touch("tiny")
+    store.touch("small")
+
+    eliminados = store.enforce_budget(keep=["small"])
+
+    assert eliminados == ["base"]
+    assert not (models / "base.pt").exists()
+    assert store.get("base") is None
+    assert store.total_size() <= 45
+
+
+def test_cli_names_resolve_to_checkpoint_files(tmp_path):
+    store, (models, _) = make_store(tmp_path, budget=25)
+    (models / "large-v3.pt").write_bytes(b"l" * 20)
+    (models / "base.pt").write_bytes(b"b" * 10)
+    store.refresh()
+
+    with mock.patch("model_store._sha256") as sha256:
+        assert store.register("large")["name"] == "large-v3"
+    sha256.assert_not_called()
+    store.touch("large")
+
+    assert store.path_for("large") == models / "large-v3.pt"
+    assert store.get("large")["last_used"] is not None
+    assert store.enforce_budget(keep=["large"]) == ["base"]
+    assert (models / "large-v3.pt").exists()
+
+
+def test_linked_copy_is_not_hashed_again(tmp_path):
+    store, (models, cache) = make_store(tmp_path)
+    (models / "tiny.pt").write_bytes(b"same")
+    (cache / "tiny.pt").write_bytes(b"same")
+    store.refresh()
+    store.hash_pending()
+
+    with mock.patch("model_store._sha256") as sha256:
+        store.refresh()
+        store.hash_pending()
+    sha256.assert_not_called()
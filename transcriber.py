@@ -1,13 +1,30 @@
+import json
 import os
+import re
 import subprocess
 import sys
+import tempfile
+import time
 import logging
 from pathlib import Path
 from env_manager import EnvironmentManager  # Importar EnvironmentManager
+from model_manager import WhisperModelManager
 
 
 logger = logging.getLogger(__name__)
 
+# Modelo rápido usado para el borrador en la transcripción en dos pasadas
+DRAFT_MODEL = "base"
+# Umbrales por debajo (logprob) o por encima (no_speech) de los cuales un
+# segmento del borrador se considera de baja confianza y se refina
+LOGPROB_THRESHOLD = -0.8
+NO_SPEECH_THRESHOLD = 0.6
+
+# Línea de segmento que imprime la CLI de Whisper en modo verbose
+_SEGMENT_LINE = re.compile(
+    r"^\[((?:\d+:)?\d+:\d+\.\d+) --> ((?:\d+:)?\d+:\d+\.\d+)\]\s*(.*)$"
+)
+
 
 def convert_audio(input_path: str) -> str:
     """Convert an audio file to WAV using FFmpeg and return the new path."""
@@ -32,45 +49,15 @@ def convert_audio(input_path: str) -> str:
     return output_path
 
 
-def transcribe_audio(audio_path, model, language, env_path=None, status_cb=None):
-    """Transcribe an audio file using Whisper.
-
-    Parameters
-    ----------
-    audio_path : str
-        Path to the audio file.
-    model : str
-        Whisper model to use.
-    language : str
-        Language of the audio.
-    env_path : str, optional
-        Path to a virtual environment whose Python interpreter should be
-        used to run Whisper. If not provided, the system's default
-        interpreter will be used.
-    status_cb : callable, optional
-        Function called with status messages during the process.
-
-    Returns
-    -------
-    str
-        Path to the generated transcription file.
+def _prepare_audio(audio_path: Path, status_cb=None) -> Path:
+    """Return the audio path Whisper should read, converting it if needed.
 
     Raises
     ------
     RuntimeError
-        If Whisper execution fails or the output file is not created.
-        Also if FFmpeg is required but not found.
+        If FFmpeg is required but not found.
     """
-    audio_path = Path(audio_path).resolve()
-    output_dir = audio_path.parent
-    base_name = audio_path.stem
     file_extension = audio_path.suffix.lower()  # Obtener la extensión del archivo
-
-
-    default_output = output_dir / f"{base_name}.txt"
-    target_output = output_dir / f"{base_name}_transc.txt"
-    logger.info("Preparando transcripción de %s", audio_path)
-
     supported = {".wav", ".m4a", ".mp3", ".ogg", ".flac", ".webm"}
     audio_for_whisper = audio_path
 
@@ -94,6 +81,18 @@ def transcribe_audio(audio_path, model, language, env_path=None, status_cb=None)
                 status_cb(f"ERROR: {msg}")
             raise RuntimeError(msg)
 
+    return audio_for_whisper
+
+
+def _whisper_command(audio_for_whisper, model, language, output_dir,
+                     output_format="txt", env_path=None, status_cb=None):
+    """Build the Whisper CLI command and the environment to run it.
+
+    Returns
+    -------
+    tuple
+        ``(cmd, env)`` ready to be passed to :mod:`subprocess`.
+    """
     # Configuración de los comandos y entorno para el subproceso de Whisper
     # Crear un diccionario de entorno copiando el actual y configurando PYTHONIOENCODING
     whisper_env = os.environ.copy()
@@ -117,27 +116,89 @@ def transcribe_audio(audio_path, model, language, env_path=None, status_cb=None)
         )
         if not python_exe.exists():
             raise RuntimeError(f"No se encontró el intérprete de Python en {python_exe}")
-        cmd = [python_exe, "-m", "whisper", audio_for_whisper,
-               "--model", model,
-               "--output_format", "txt",
-               "--output_dir", str(output_dir)]
         logger.info("Usando intérprete de entorno: %s", python_exe)
     else:
-        cmd = [sys.executable, "-m", "whisper", audio_for_whisper,
-               "--model", model,
-               "--output_format", "txt",
-               "--output_dir", str(output_dir)]
+        python_exe = sys.executable
         logger.info("Usando intérprete actual: %s", sys.executable)
 
+    cmd = [str(python_exe), "-m", "whisper", str(audio_for_whisper),
+           "--model", model,
+           "--output_format", output_format,
+           "--output_dir", str(output_dir)]
+
     if language:
         cmd.extend(["--language", language])
-    logger.info("Ejecutando comando: %s", " ".join(cmd))
 
-    cache_dir = Path(os.path.expanduser("~")) / ".cache" / "whisper"
-    model_file = cache_dir / f"{model}.pt"
-    if status_cb and not model_file.exists():
+    # Usar la copia del almacén local para que Whisper no vuelva a descargarla
+    model_file = WhisperModelManager.get_store().path_for(model)
+    if model_file is not None:
+        cmd.extend(["--model_dir", str(model_file.parent)])
+    elif status_cb:
         status_cb("Descargando modelo...")
 
+    return cmd, whisper_env
+
+
+def _register_model_use(model, status_cb=None, keep=()) -> None:
+    """Record a model use (and a possible download) in the local store.
+
+    The disk budget is then enforced, never evicting ``model`` nor the
+    models in ``keep``.
+    """
+    store = WhisperModelManager.get_store()
+    store.register(model)
+    store.touch(model)
+    # El SHA256 de una descarga nueva se calcula sin retrasar la transcripción
+    store.hash_pending_async([model])
+    for eliminado in store.enforce_budget(keep=[model, *keep]):
+        if status_cb:
+            status_cb(f"Modelo '{eliminado}' eliminado por límite de espacio")
+
+
+def transcribe_audio(audio_path, model, language, env_path=None, status_cb=None):
+    """Transcribe an audio file using Whisper.
+
+    Parameters
+    ----------
+    audio_path : str
+        Path to the audio file.
+    model : str
+        Whisper model to use.
+    language : str
+        Language of the audio.
+    env_path : str, optional
+        Path to a virtual environment whose Python interpreter should be
+        used to run Whisper. If not provided, the system's default
+        interpreter will be used.
+    status_cb : callable, optional
+        Function called with status messages during the process.
+
+    Returns
+    -------
+    str
+        Path to the generated transcription file.
+
+    Raises
+    ------
+    RuntimeError
+        If Whisper execution fails or the output file is not created.
+        Also if FFmpeg is required but not found.
+    """
+    audio_path = Path(audio_path).resolve()
+    output_dir = audio_path.parent
+    base_name = audio_path.stem
+
+    default_output = output_dir / f"{base_name}.txt"
+    target_output = output_dir / f"{base_name}_transc.txt"
+    logger.info("Preparando transcripción de %s", audio_path)
+
+    audio_for_whisper = _prepare_audio(audio_path, status_cb)
+    cmd, whisper_env = _whisper_command(
+        audio_for_whisper, model, language, output_dir,
+        env_path=env_path, status_cb=status_cb,
+    )
+    logger.info("Ejecutando comando: %s", " ".join(cmd))
+
     if status_cb:
         status_cb("Transcribiendo audio...")
     logger.info("Iniciando transcripción con modelo %s", model)
@@ -175,9 +236,288 @@ def transcribe_audio(audio_path, model, language, env_path=None, status_cb=None)
     if not target_output.exists() or target_output.stat().st_size <= 0:
         raise RuntimeError('Transcripción vacía')
 
+    # Registrar el uso del modelo (y una posible descarga) en el manifiesto
+    _register_model_use(model, status_cb)
+
     return target_output
 
 
+def _parse_timestamp(texto: str) -> float:
+    segundos = 0.0
+    for parte in texto.split(":"):
+        segundos = segundos * 60 + float(parte)
+    return segundos
+
+
+def _run_whisper_json(audio_for_whisper, model, language, env_path=None,
+                      status_cb=None, extra_args=(), segment_cb=None):
+    """Run the Whisper CLI with JSON output and return its segments.
+
+    Segments printed by Whisper while it runs are passed to ``segment_cb``
+    as soon as they are read, before the process finishes.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cmd, whisper_env = _whisper_command(
+            audio_for_whisper, model, language, tmp_dir,
+            output_format="json", env_path=env_path, status_cb=status_cb,
+        )
+        cmd.extend(["--verbose", "True", *extra_args])
+        # Sin búfer para recibir cada segmento en cuanto Whisper lo imprime
+        whisper_env['PYTHONUNBUFFERED'] = '1'
+        logger.info("Ejecutando comando: %s", " ".join(cmd))
+
+        salida = []
+        proc = subprocess.Popen(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+            encoding='utf-8', errors='replace', env=whisper_env,
+        )
+        for linea in proc.stdout:
+            salida.append(linea)
+            match = _SEGMENT_LINE.match(linea.strip())
+            if match and segment_cb:
+                segment_cb({
+                    "start": _parse_timestamp(match.group(1)),
+                    "end": _parse_timestamp(match.group(2)),
+                    "text": match.group(3).strip(),
+                })
+        proc.wait()
+        if proc.returncode != 0:
+            msg = "".join(salida).strip() or f"código {proc.returncode}"
+            logger.error("Error al ejecutar Whisper: %s", msg)
+            raise RuntimeError(f"Error al ejecutar Whisper: {msg}")
+
+        json_output = Path(tmp_dir) / f"{Path(audio_for_whisper).stem}.json"
+        if not json_output.exists():
+            error_msg = f"No se encontró el archivo de salida esperado: {json_output}. " \
+                        "Verifica los logs anteriores para posibles errores de Whisper."
+            logger.error(error_msg)
+            raise RuntimeError(error_msg)
+        with open(json_output, "r", encoding="utf-8") as fh:
+            return json.load(fh).get("segments", [])
+
+
+def _is_low_confidence(segment, logprob_threshold, no_speech_threshold) -> bool:
+    return (
+        segment.get("avg_logprob", 0.0) < logprob_threshold
+        or segment.get("no_speech_prob", 0.0) > no_speech_threshold
+    )
+
+
+def _merge_clips(segments):
+    """Join the time ranges of consecutive segments into clips."""
+    clips = []
+    for seg in segments:
+        if clips and seg["start"] <= clips[-1][1]:
+            clips[-1][1] = max(clips[-1][1], seg["end"])
+        else:
+            clips.append([seg["start"], seg["end"]])
+    return clips
+
+
+def _clip_index(segment, clips):
+    """Index of the clip containing the segment midpoint, or ``None``."""
+    medio = (segment["start"] + segment["end"]) / 2
+    for idx, (ini, fin) in enumerate(clips):
+        if ini <= medio <= fin:
+            return idx
+    return None
+
+
+def transcribe_draft_refine(audio_path, model, language, draft_model=DRAFT_MODEL,
+                            env_path=None, status_cb=None, segments_cb=None,
+                            refine_all=False, logprob_threshold=LOGPROB_THRESHOLD,
+                            no_speech_threshold=NO_SPEECH_THRESHOLD):
+    """Transcribe in two passes: a fast draft followed by a refinement.
+
+    The draft model produces a first transcription that is handed to
+    ``segments_cb`` right away. ``model`` then re-transcribes only the
+    low-confidence segments of the draft (or the whole audio when
+    ``refine_all`` is set) and each refined segment replaces the draft
+    ones covering the same time range as soon as Whisper emits it.
+
+    Parameters
+    ----------
+    audio_path : str
+        Path to the audio file.
+    model : str
+        Whisper model used for the refinement pass.
+    language : str
+        Language of the audio.
+    draft_model : str, optional
+        Fast Whisper model used for the draft pass.
+    env_path : str, optional
+        Path to a virtual environment whose Python interpreter should be
+        used to run Whisper.
+    status_cb : callable, optional
+        Function called with status messages during the process.
+    segments_cb : callable, optional
+        Function called with the current list of segments (dicts with
+        ``start``, ``end``, ``text`` and ``refined``) every time it changes.
+    refine_all : bool, optional
+        Refine every segment instead of only the low-confidence ones.
+    logprob_threshold : float, optional
+        Segments with a lower ``avg_logprob`` are refined.
+    no_speech_threshold : float, optional
+        Segments with a higher ``no_speech_prob`` are refined.
+
+    Returns
+    -------
+    tuple
+        Path to the generated transcription file and a dict with timing
+        statistics: ``time_to_first_text``, ``refine_time``, ``total_time``,
+        ``single_pass_estimate``, ``refined_segments``, ``total_segments``,
+        ``refined_seconds``, ``audio_seconds`` and ``refine_error`` (the
+        error message when the refinement failed and the draft was kept).
+
+    Raises
+    ------
+    RuntimeError
+        If the draft pass fails or the output file is not created.
+        Also if FFmpeg is required but not found. A failed refinement
+        does not raise: the draft is saved instead.
+    """
+    audio_path = Path(audio_path).resolve()
+    target_output = audio_path.parent / f"{audio_path.stem}_transc.txt"
+    logger.info("Preparando transcripción en dos pasadas de %s", audio_path)
+
+    audio_for_whisper = _prepare_audio(audio_path, status_cb)
+    inicio = time.perf_counter()
+
+    if status_cb:
+        status_cb(f"Generando borrador con el modelo {draft_model}...")
+    draft = _run_whisper_json(audio_for_whisper, draft_model, language, env_path, status_cb)
+    segmentos = [
+        {"start": seg["start"], "end": seg["end"], "text": seg["text"].strip(), "refined": False}
+        for seg in draft
+    ]
+    if segments_cb:
+        segments_cb(list(segmentos))
+    time_to_first_text = time.perf_counter() - inicio
+    logger.info("Borrador listo en %.1f s", time_to_first_text)
+    # Proteger también el modelo de refinado para no borrarlo antes de usarlo
+    _register_model_use(draft_model, status_cb, keep=[model])
+
+    if refine_all:
+        a_refinar = draft
+    else:
+        a_refinar = [
+            seg for seg in draft
+            if _is_low_confidence(seg, logprob_threshold, no_speech_threshold)
+        ]
+    clips = _merge_clips(a_refinar)
+    audio_seconds = draft[-1]["end"] if draft else 0.0
+    refined_seconds = sum(fin - ini for ini, fin in clips)
+
+    refine_error = None
+    refinados = None
+    inicio_refinado = time.perf_counter()
+    if clips:
+        if status_cb:
+            status_cb(
+                f"Refinando {len(a_refinar)} de {len(draft)} segmentos con el modelo {model}..."
+            )
+        # Clips cuyos segmentos del borrador ya se han sustituido
+        sustituidos = set()
+
+        def _on_refined(seg):
+            idx = _clip_index(seg, clips)
+            if idx is None:
+                return
+            if idx not in sustituidos:
+                sustituidos.add(idx)
+                segmentos[:] = [
+                    s for s in segmentos
+                    if s["refined"] or _clip_index(s, clips) != idx
+                ]
+            segmentos.append({**seg, "refined": True})
+            segmentos.sort(key=lambda s: s["start"])
+            if segments_cb:
+                segments_cb(list(segmentos))
+
+        extra = []
+        if not refine_all:
+            extra = ["--clip_timestamps", ",".join(f"{ini:.3f},{fin:.3f}" for ini, fin in clips)]
+        borrador = list(segmentos)
+        try:
+            refinados = _run_whisper_json(
+                audio_for_whisper, model, language, env_path, status_cb,
+                extra_args=extra, segment_cb=_on_refined,
+            )
+        except RuntimeError as e:
+            # Conservar el borrador ya mostrado en lugar de perder la salida
+            refine_error = str(e)
+            logger.error("Error al refinar, se conserva el borrador: %s", e)
+            if status_cb:
+                status_cb(f"Error al refinar, se conserva el borrador: {e}")
+            refinados = None
+            segmentos[:] = borrador
+            if segments_cb:
+                segments_cb(list(segmentos))
+
+    # Medir antes de registrar el modelo para no contar tareas ajenas a Whisper
+    refine_time = time.perf_counter() - inicio_refinado
+    total_time = time.perf_counter() - inicio
+
+    if refinados is not None:
+        # El JSON final es la referencia: sustituye lo leído en streaming con
+        # el mismo criterio de pertenencia a un clip
+        if refine_all:
+            segmentos[:] = []
+        else:
+            segmentos[:] = [s for s in borrador if _clip_index(s, clips) is None]
+        segmentos.extend(
+            {"start": seg["start"], "end": seg["end"], "text": seg["text"].strip(), "refined": True}
+            for seg in refinados
+            if refine_all or _clip_index(seg, clips) is not None
+        )
+        segmentos.sort(key=lambda s: s["start"])
+        if segments_cb:
+            segments_cb(list(segmentos))
+        _register_model_use(model, status_cb, keep=[draft_model])
+
+    # Estimar lo que habría costado una sola pasada con el modelo grande
+    if refinados is None or refined_seconds <= 0:
+        single_pass_estimate = None
+    elif refine_all or refined_seconds >= audio_seconds:
+        single_pass_estimate = refine_time
+    else:
+        single_pass_estimate = refine_time * audio_seconds / refined_seconds
+
+    with open(target_output, "w", encoding="utf-8") as fh:
+        for seg in segmentos:
+            if seg["text"]:
+                fh.write(seg["text"] + "\n")
+    if not target_output.exists() or target_output.stat().st_size <= 0:
+        raise RuntimeError('Transcripción vacía')
+
+    stats = {
+        "time_to_first_text": time_to_first_text,
+        "refine_time": refine_time,
+        "total_time": total_time,
+        "single_pass_estimate": single_pass_estimate,
+        "refined_segments": len(a_refinar),
+        "total_segments": len(draft),
+        "refined_seconds": refined_seconds,
+        "audio_seconds": audio_seconds,
+        "refine_error": refine_error,
+    }
+    resumen = (
+        f"Primer texto en {time_to_first_text:.1f} s; total {total_time:.1f} s "
+        f"({len(a_refinar)}/{len(draft)} segmentos refinados)"
+    )
+    if refine_error is not None:
+        resumen += "; el refinado falló y se guardó el borrador"
+    if single_pass_estimate is not None:
+        resumen += f"; una sola pasada con {model}: ~{single_pass_estimate:.1f} s"
+    logger.info(resumen)
+    if status_cb:
+        status_cb(resumen)
+        status_cb("Transcripción finalizada")
+    logger.info("Transcripción finalizada: %s", target_output)
+
+    return target_output, stats
+
+
 def diarize_transcription(audio_path: str, transcript_file: str, status_cb=None) -> str:
     """Assign speaker labels to the transcription using whisperx.
 